@@ -0,0 +1,241 @@
+"""
+Primary/replica database routing.
+
+Writes always go to ``default`` (the primary). Reads go to a healthy replica
+from ``settings.DATABASE_REPLICAS``, except when:
+
+- the current request wrote, or was pinned by ``PrimaryPinningMiddleware``
+  because the same user (or browser) wrote within the last
+  ``DATABASE_PRIMARY_PIN_SECONDS`` (read-your-writes);
+- the code runs inside a transaction on the primary or under ``use_primary()``;
+- the model is listed in ``DATABASE_PRIMARY_ONLY_MODELS`` (e.g. the token
+  blacklist, where a stale read would let a revoked token through).
+
+Replica health is rechecked at most every ``DATABASE_REPLICA_CHECK_INTERVAL``
+seconds. Replicas that are unreachable, or lag by more than
+``DATABASE_REPLICA_MAX_LAG`` seconds, are skipped. With no healthy replica,
+reads fall back to the primary.
+"""
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+_pinned = contextvars.ContextVar('db_pinned_to_primary', default=False)
+_wrote = contextvars.ContextVar('db_wrote', default=False)
+_identities = contextvars.ContextVar('db_pin_identities', default=None)
+
+
+def wrote_to_primary():
+    return _wrote.get()
+
+
+def pin_identity(kind, value):
+    """Pin ``kind``/``value`` (e.g. ``'user', 42``) to the primary for
+    DATABASE_PRIMARY_PIN_SECONDS if the current request writes."""
+    identities = _identities.get()
+    if identities is not None and value is not None:
+        identities.add(f'{kind}:{value}')
+
+
+def identity_pinned(kind, value):
+    """Whether ``kind``/``value`` wrote recently and should read from the primary.
+
+    If the pin cache is unreachable the answer is yes: reading from the primary
+    is always correct, only slower.
+    """
+    if value is None:
+        return False
+    try:
+        return _pin_cache().get(f'db_pin:{kind}:{value}') is not None
+    except Exception as exc:
+        logger.warning("Primary pin cache lookup failed; reading from the primary: %s", exc)
+        return True
+
+
+def save_pins(identities):
+    if not identities:
+        return
+    seconds = getattr(settings, 'DATABASE_PRIMARY_PIN_SECONDS', 5)
+    try:
+        _pin_cache().set_many({f'db_pin:{identity}': 1 for identity in identities}, seconds)
+    except Exception as exc:
+        # The write has already committed; losing the pin only risks a stale read.
+        logger.warning("Could not save primary pins %s: %s", sorted(identities), exc)
+
+
+def _pin_cache():
+    return caches[getattr(settings, 'DATABASE_PRIMARY_PIN_CACHE', 'default')]
+
+
+@contextmanager
+def use_primary():
+    """Read from the primary inside the block, e.g. when a stale read would be
+    a correctness or security problem."""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+@contextmanager
+def request_scope(pinned=False):
+    """Fresh routing state for one request. Used by the pinning middleware;
+    yields the set of identities to pin if the request writes."""
+    identities = set()
+    pinned_token = _pinned.set(pinned)
+    wrote_token = _wrote.set(False)
+    identities_token = _identities.set(identities)
+    try:
+        yield identities
+    finally:
+        _pinned.reset(pinned_token)
+        _wrote.reset(wrote_token)
+        _identities.reset(identities_token)
+
+
+class ReplicaHealth:
+    """Cached reachability and lag status for each replica alias."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._healthy = []
+
+    def healthy(self, aliases):
+        interval = getattr(settings, 'DATABASE_REPLICA_CHECK_INTERVAL', 5)
+        if time.monotonic() - self._checked_at >= interval and self._lock.acquire(blocking=False):
+            # Only one thread refreshes; the others keep using the last result.
+            try:
+                self._healthy = [alias for alias in aliases if self.check(alias)]
+                self._checked_at = time.monotonic()
+            finally:
+                self._lock.release()
+        return self._healthy
+
+    def check(self, alias):
+        max_lag = getattr(settings, 'DATABASE_REPLICA_MAX_LAG', 5)
+        try:
+            lag = replica_lag(alias)
+        except Exception as exc:
+            logger.warning("Replica %s failed its health check: %s", alias, exc)
+            return False
+        if lag is not None and lag > max_lag:
+            logger.warning("Replica %s is %.1fs behind the primary; reading from the primary", alias, lag)
+            return False
+        return True
+
+    def reset(self):
+        self._checked_at = 0.0
+        self._healthy = []
+
+
+def replica_lag(alias):
+    """Seconds the replica is behind the primary, or ``None`` if the backend
+    can't tell. Raises if the replica is unreachable."""
+    connection = connections[alias]
+    vendor = connection.vendor
+
+    if vendor == 'sqlite':
+        replica = connection.settings_dict['NAME']
+        # Connecting would silently create an empty database file.
+        if not os.path.exists(replica):
+            raise FileNotFoundError(f"replica database file {replica} does not exist")
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        return sqlite_copy_lag(connections[DEFAULT_DB_ALIAS].settings_dict['NAME'], replica)
+
+    with connection.cursor() as cursor:
+        if vendor == 'postgresql':
+            # The last replay timestamp stops moving while the primary is idle,
+            # so a replica that has replayed everything it received is current.
+            cursor.execute(
+                "SELECT CASE WHEN NOT pg_is_in_recovery() THEN NULL "
+                "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+            )
+            lag = cursor.fetchone()[0]
+            return float(lag) if lag is not None else None
+        if vendor == 'mysql':
+            return _mysql_lag(cursor)
+        cursor.execute('SELECT 1')
+    return None
+
+
+def sqlite_copy_lag(primary, replica):
+    """Lag of a SQLite file copy of the primary.
+
+    Local stand-in replicas are file copies. Once the primary has been written
+    after the copy was taken, the copy is as stale as it is old.
+    """
+    copied_at = os.path.getmtime(replica)
+    if os.path.getmtime(primary) <= copied_at:
+        return 0.0
+    return time.time() - copied_at
+
+
+def _mysql_lag(cursor):
+    # SHOW REPLICA STATUS / Seconds_Behind_Source exist from MySQL 8.0.22;
+    # older MySQL and MariaDB only have the SLAVE / Master spellings.
+    try:
+        cursor.execute('SHOW REPLICA STATUS')
+    except DatabaseError:
+        cursor.execute('SHOW SLAVE STATUS')
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    status = dict(zip([col[0] for col in cursor.description], row))
+    lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+    if lag is None:
+        # NULL means replication is stopped or broken, not "no lag".
+        raise DatabaseError("replication is not running")
+    return float(lag)
+
+
+replica_health = ReplicaHealth()
+
+
+class PrimaryReplicaRouter:
+    """Database router sending writes to the primary and safe reads to replicas."""
+
+    def __init__(self):
+        self.primary_only = {label.lower() for label in getattr(settings, 'DATABASE_PRIMARY_ONLY_MODELS', [])}
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not replicas or _pinned.get() or _wrote.get():
+            return DEFAULT_DB_ALIAS
+        if model._meta.label_lower in self.primary_only:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+
+        healthy = replica_health.healthy(replicas)
+        if not healthy:
+            return DEFAULT_DB_ALIAS
+        return random.choice(healthy)
+
+    def db_for_write(self, model, **hints):
+        # Only requests pin themselves. Outside request_scope() (shells,
+        # management commands, background threads) nothing would ever reset
+        # the flag, and every later read would stay on the primary.
+        if _identities.get() is not None:
+            _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data, so relations across them are fine.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -1,5 +1,16 @@
+import logging
+import time
+
+import jwt
 from django.conf import settings
 from django.utils.deprecation import MiddlewareMixin
+from rest_framework_simplejwt.settings import api_settings
+
+from utils.audit_log import ACCESS_LOGGER, client_ip
+
+from .db_router import identity_pinned, request_scope, save_pins, wrote_to_primary
+
+access_logger = logging.getLogger(ACCESS_LOGGER)
 
 
 class FallbackCORSHeadersMiddleware(MiddlewareMixin):
@@ -35,3 +46,86 @@ class FallbackCORSHeadersMiddleware(MiddlewareMixin):
                 response['Access-Control-Expose-Headers'] = 'Content-Type, Authorization'
 
         return response
+
+
+class AccessLogMiddleware(MiddlewareMixin):
+    """Emit one structured access-log record per request.
+
+    The record's ``event`` is ``http.`` plus the resolved view name (e.g.
+    ``http.token_refresh`` or ``http.admin:login``), which keeps access events
+    apart from audit events such as ``login`` and lets the audit handler sample
+    high-volume routes per event type. The
+    handler only queues the record; the write happens on a background thread.
+    It sits after SecurityMiddleware and WhiteNoise, so the duration excludes
+    those two, and static files (answered by WhiteNoise) are not logged.
+    """
+
+    def process_request(self, request):
+        request._access_log_start = time.monotonic()
+
+    def process_response(self, request, response):
+        if not access_logger.isEnabledFor(logging.INFO):
+            return response
+
+        start = getattr(request, '_access_log_start', None)
+        match = getattr(request, 'resolver_match', None)
+        event = f"http.{match.view_name if match else 'request'}"
+        access_logger.info(event, extra={
+            'event': event,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round((time.monotonic() - start) * 1000, 2) if start is not None else None,
+            'ip': client_ip(request),
+        })
+        return response
+
+
+class PrimaryPinningMiddleware:
+    """Give each request fresh database routing state and keep a user on the
+    primary for DATABASE_PRIMARY_PIN_SECONDS after they write, so they read
+    their own writes even while replicas catch up.
+
+    The pin is stored per user in the shared DATABASE_PRIMARY_PIN_CACHE, so it
+    applies to Bearer-token clients and across workers. The user is taken from
+    the (unverified) access token; the claim only steers routing, so a forged
+    one can do no more than send reads to the primary. Views can pin other
+    identities with ``pin_identity`` (e.g. the username at registration). A
+    cookie is set as well, for browser clients with no token yet.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        cookie_name = getattr(settings, 'DATABASE_PRIMARY_PIN_COOKIE', 'db_pin')
+        pinned = cookie_name in request.COOKIES or identity_pinned('user', self._bearer_user_id(request))
+        with request_scope(pinned=pinned) as identities:
+            response = self.get_response(request)
+            if wrote_to_primary():
+                # DRF copies the authenticated user onto the Django request.
+                user = getattr(request, 'user', None)
+                if user is not None and user.is_authenticated:
+                    identities.add(f'user:{user.pk}')
+                save_pins(identities)
+                # SameSite=None so the cross-origin frontend sends it back.
+                response.set_cookie(
+                    cookie_name,
+                    '1',
+                    max_age=getattr(settings, 'DATABASE_PRIMARY_PIN_SECONDS', 5),
+                    httponly=True,
+                    secure=getattr(settings, 'DATABASE_PRIMARY_PIN_COOKIE_SECURE', False),
+                    samesite='None',
+                )
+        return response
+
+    @staticmethod
+    def _bearer_user_id(request):
+        auth_header = request.headers.get('Authorization', '')
+        if not auth_header.startswith('Bearer '):
+            return None
+        try:
+            payload = jwt.decode(auth_header[7:].strip(), options={'verify_signature': False})
+        except jwt.PyJWTError:
+            return None
+        return payload.get(api_settings.USER_ID_CLAIM)
@@ -5,6 +5,8 @@ Django settings for app_marvel_backend project.
 from pathlib import Path
 import os
 
+import dj_database_url
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,10 +44,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    # Answer static requests before any other middleware (or logging) runs
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'app_marvel_backend.middleware.AccessLogMiddleware',
+    'app_marvel_backend.middleware.PrimaryPinningMiddleware',
     'app_marvel_backend.middleware.FallbackCORSHeadersMiddleware',
     'corsheaders.middleware.CorsMiddleware',
-    'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # For static files
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -82,6 +87,33 @@ DATABASES = {
     }
 }
 
+# Read replicas (see app_marvel_backend/db_router.py). Comma-separated database
+# URLs; each becomes a `replica_<n>` alias. For local testing point them at
+# SQLite copies of the primary kept fresh by `manage.py sync_sqlite_replicas`,
+# e.g. DATABASE_REPLICA_URLS=sqlite:///replica1.sqlite3,sqlite:///replica2.sqlite3
+DATABASE_REPLICAS = []
+for index, url in enumerate(
+    [u.strip() for u in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if u.strip()], start=1
+):
+    alias = f'replica_{index}'
+    DATABASES[alias] = dict(dj_database_url.parse(url), TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['app_marvel_backend.db_router.PrimaryReplicaRouter']
+# Replicas further behind than this (seconds) or unreachable are skipped.
+DATABASE_REPLICA_MAX_LAG = float(os.environ.get('DATABASE_REPLICA_MAX_LAG', '5'))
+DATABASE_REPLICA_CHECK_INTERVAL = float(os.environ.get('DATABASE_REPLICA_CHECK_INTERVAL', '5'))
+# How long a user that wrote keeps reading from the primary. Pins live in the
+# `db_pin` cache, which must be shared by all workers (set REDIS_URL) for
+# read-your-writes to hold across them.
+DATABASE_PRIMARY_PIN_SECONDS = int(os.environ.get('DATABASE_PRIMARY_PIN_SECONDS', '5'))
+DATABASE_PRIMARY_PIN_CACHE = 'db_pin'
+# The db_pin cookie is sent with SameSite=None, which browsers only accept on
+# Secure cookies; leave this off for plain-HTTP local development.
+DATABASE_PRIMARY_PIN_COOKIE_SECURE = os.environ.get('DATABASE_PRIMARY_PIN_COOKIE_SECURE', 'False').lower() == 'true'
+# Always read these from the primary: a stale blacklist read would accept a revoked token.
+DATABASE_PRIMARY_ONLY_MODELS = ['token_blacklist.blacklistedtoken', 'authentication.tokenrevocation']
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -108,6 +140,17 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# collectstatic writes content-hashed copies plus .gz/.br variants; WhiteNoise
+# serves the hashed names with `Cache-Control: max-age=315360000, public, immutable`.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -144,6 +187,42 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
 }
 
+# Asymmetric JWT signing (see apps/authentication/signing.py). Comma-separated
+# PEM private key files (RSA -> RS256, Ed25519 -> EdDSA). The first key signs new
+# tokens; the others stay in the JWKS document and keep verifying tokens issued
+# before a rotation. Leave unset to keep signing with the HS256 SECRET_KEY.
+JWT_SIGNING_KEY_FILES = [
+    path.strip() for path in os.environ.get('JWT_SIGNING_KEY_FILES', '').split(',') if path.strip()
+]
+JWKS_CACHE_MAX_AGE = int(os.environ.get('JWKS_CACHE_MAX_AGE', '300'))
+JWT_INTROSPECTION_MAX_TOKENS = int(os.environ.get('JWT_INTROSPECTION_MAX_TOKENS', '500'))
+JWT_INTROSPECTION_CACHE_TTL = int(os.environ.get('JWT_INTROSPECTION_CACHE_TTL', '5'))
+# Non-staff service accounts must be in this group to call batch introspection.
+JWT_INTROSPECTION_GROUP = os.environ.get('JWT_INTROSPECTION_GROUP', 'token-introspection')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Read-your-writes pins (see app_marvel_backend/db_router.py)
+    'db_pin': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    } if os.environ.get('REDIS_URL') else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'db_pin',
+    },
+    # Per-token introspection results; sized for several full batches so one
+    # large batch doesn't evict itself.
+    'introspection': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'introspection',
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('JWT_INTROSPECTION_CACHE_ENTRIES', '20000')),
+        },
+    },
+}
+
 # Cookie and security settings for cross-site frontend development
 # When using credentials from the browser (withCredentials / include), cookies need samesite=None and secure flags.
 SESSION_COOKIE_SAMESITE = None
@@ -152,4 +231,49 @@ CSRF_COOKIE_SAMESITE = None
 CSRF_COOKIE_SECURE = os.environ.get('CSRF_COOKIE_SECURE', 'False').lower() == 'true'
 
 # If behind a proxy (like Railway), set this to ensure request.is_secure() works when using HTTPS
-SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
\ No newline at end of file
+SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+
+# Number of reverse proxies in front of the app that append to X-Forwarded-For
+# (1 on Railway). Log records take the client IP from the hop the outermost
+# trusted proxy added; 0 means use REMOTE_ADDR.
+TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', '1' if 'RAILWAY_ENVIRONMENT' in os.environ else '0'))
+
+# Structured access/audit logging. Records are queued and written as JSON lines
+# by a background thread (see utils/audit_log.py). Leave AUDIT_LOG_FILE unset to
+# write to stdout, which is what Railway collects.
+AUDIT_LOG_FILE = os.environ.get('AUDIT_LOG_FILE') or None
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'utils.audit_log.JSONLinesFormatter',
+        },
+    },
+    'handlers': {
+        'audit_queue': {
+            'class': 'utils.audit_log.AuditQueueHandler',
+            'formatter': 'json',
+            'filename': AUDIT_LOG_FILE,
+            'max_queue': int(os.environ.get('AUDIT_LOG_MAX_QUEUE', '10000')),
+            'batch_size': int(os.environ.get('AUDIT_LOG_BATCH_SIZE', '200')),
+            'flush_interval': float(os.environ.get('AUDIT_LOG_FLUSH_INTERVAL', '1.0')),
+            'sample_rates': {
+                # Refresh is by far the most frequent call; keep a sample only.
+                'http.token_refresh': float(os.environ.get('AUDIT_LOG_REFRESH_SAMPLE_RATE', '0.1')),
+            },
+        },
+    },
+    'loggers': {
+        'marvel.access': {
+            'handlers': ['audit_queue'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'marvel.audit': {
+            'handlers': ['audit_queue'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
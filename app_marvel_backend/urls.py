@@ -16,9 +16,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from apps.authentication import views as auth_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # Conventional discovery location for the JWKS document
+    path('.well-known/jwks.json', auth_views.jwks, name='well_known_jwks'),
     path('api/auth/', include('apps.authentication.urls')),
     # Provide legacy /auth/ endpoints for deploy/platform compatibility
     path('auth/', include('apps.authentication.urls')),
@@ -3,4 +3,8 @@ from django.apps import AppConfig
 
 class AuthenticationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'apps.authentication'
\ No newline at end of file
+    name = 'apps.authentication'
+
+    def ready(self):
+        from .signing import install_token_backend
+        install_token_backend()
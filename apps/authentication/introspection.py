@@ -0,0 +1,126 @@
+"""
+Batch token introspection for downstream services.
+
+Services that can't verify tokens locally against the JWKS document can send
+hundreds of tokens in one call. Every token is checked for signature, expiry,
+user status and revocation, and each result is cached for a few seconds keyed
+by the token's hash. A whole batch costs at most three queries, however many
+tokens it contains.
+
+Revocation follows the existing logout semantics. A refresh token is revoked
+once its own jti is blacklisted. An access token is revoked when it was issued
+before its user's last global logout (``TokenRevocation``). ``iat`` has whole
+second precision, so a token issued in the same second as the logout counts as
+revoked: the check fails closed, and a login that races a logout has to log in
+again.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import UntypedToken
+
+from .models import TokenRevocation
+
+User = get_user_model()
+
+CACHE_PREFIX = 'introspect:'
+
+
+def introspect_tokens(tokens):
+    """Return one result dict per token, in the order given.
+
+    Active tokens yield ``{'active': True, 'token_type', 'user_id', 'exp',
+    'jti'}``. Inactive ones yield ``{'active': False, 'reason': ...}``.
+    """
+    ttl = getattr(settings, 'JWT_INTROSPECTION_CACHE_TTL', 5)
+    cache = caches['introspection']
+    keys = [CACHE_PREFIX + hashlib.sha256(token.encode('utf-8')).hexdigest() for token in tokens]
+    cached = cache.get_many(keys) if ttl > 0 else {}
+
+    results = [cached.get(key) for key in keys]
+    pending = {}
+    for index, (token, result) in enumerate(zip(tokens, results)):
+        if result is not None:
+            continue
+        try:
+            payload = UntypedToken(token).payload
+        except TokenError as exc:
+            results[index] = {'active': False, 'reason': str(exc)}
+            continue
+        pending[index] = payload
+
+    if pending:
+        for index, result in _check_revocation(pending).items():
+            results[index] = result
+
+    if ttl > 0:
+        now = time.time()
+        to_cache = {}
+        for index, key in enumerate(keys):
+            if key in cached:
+                continue
+            # Never cache an active result past the token's own expiry.
+            exp = results[index].get('exp')
+            if exp is None or exp - now >= ttl:
+                to_cache[key] = results[index]
+        if to_cache:
+            cache.set_many(to_cache, ttl)
+
+    return results
+
+
+def _check_revocation(payloads):
+    user_claim = api_settings.USER_ID_CLAIM
+    jti_claim = api_settings.JTI_CLAIM
+    user_ids = {payload.get(user_claim) for payload in payloads.values()} - {None}
+    refresh_jtis = {
+        payload.get(jti_claim)
+        for payload in payloads.values()
+        if payload.get(api_settings.TOKEN_TYPE_CLAIM) == 'refresh'
+    } - {None}
+
+    active_users = {
+        str(pk) for pk in User.objects.filter(pk__in=user_ids, is_active=True).values_list('pk', flat=True)
+    }
+    blacklisted_jtis = set(
+        BlacklistedToken.objects.filter(token__jti__in=refresh_jtis).values_list('token__jti', flat=True)
+    ) if refresh_jtis else set()
+    last_logout = {
+        str(user_id): revoked_at
+        for user_id, revoked_at in TokenRevocation.objects.filter(user_id__in=user_ids)
+        .values_list('user_id', 'revoked_at')
+    } if user_ids else {}
+
+    results = {}
+    for index, payload in payloads.items():
+        user_id = payload.get(user_claim)
+        token_type = payload.get(api_settings.TOKEN_TYPE_CLAIM)
+        jti = payload.get(jti_claim)
+
+        if user_id is None or str(user_id) not in active_users:
+            results[index] = {'active': False, 'reason': 'user_inactive'}
+        elif token_type == 'refresh' and jti in blacklisted_jtis:
+            results[index] = {'active': False, 'reason': 'revoked'}
+        elif token_type != 'refresh' and _issued_before(payload, last_logout.get(str(user_id))):
+            results[index] = {'active': False, 'reason': 'revoked'}
+        else:
+            results[index] = {
+                'active': True,
+                'token_type': token_type,
+                'user_id': user_id,
+                'exp': payload.get('exp'),
+                'jti': jti,
+            }
+    return results
+
+
+def _issued_before(payload, logged_out_at):
+    if logged_out_at is None or payload.get('iat') is None:
+        return False
+    return payload['iat'] <= int(logged_out_at.timestamp())
@@ -0,0 +1,86 @@
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from app_marvel_backend.middleware import AccessLogMiddleware
+from utils.audit_log import ACCESS_LOGGER, AuditQueueHandler, JSONLinesFormatter
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure per-request overhead of AccessLogMiddleware with no logging, "
+        "a synchronous file handler and the queued JSON-lines handler."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000)
+        parser.add_argument('--event', default='token_obtain_pair',
+                            help="view name to attribute requests to (try 'token_refresh' to see sampling)")
+
+    def handle(self, *args, **options):
+        n = options['requests']
+        logger = logging.getLogger(ACCESS_LOGGER)
+        saved = (logger.handlers[:], logger.level, logger.propagate)
+
+        factory = RequestFactory()
+        response = HttpResponse(b'{}', content_type='application/json')
+        middleware = AccessLogMiddleware(lambda request: response)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            sync_handler = logging.FileHandler(os.path.join(tmp, 'sync.jsonl'))
+            sync_handler.setFormatter(JSONLinesFormatter())
+            queued_handler = AuditQueueHandler(
+                filename=os.path.join(tmp, 'queued.jsonl'),
+                sample_rates={'http.token_refresh': 0.1},
+            )
+            cases = [
+                ('disabled', None),
+                ('sync file', sync_handler),
+                ('queued', queued_handler),
+            ]
+
+            self.stdout.write(f"{n} requests, event={options['event']!r}")
+            self.stdout.write(f"{'handler':<12}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}")
+            try:
+                for label, handler in cases:
+                    logger.handlers = [handler] if handler else []
+                    logger.setLevel(logging.INFO if handler else logging.CRITICAL)
+                    logger.propagate = False
+
+                    timings = []
+                    for i in range(n):
+                        request = factory.post('/api/auth/login/', REMOTE_ADDR='127.0.0.1')
+                        request.resolver_match = _Match(options['event'])
+                        start = time.perf_counter()
+                        middleware(request)
+                        timings.append((time.perf_counter() - start) * 1e6)
+
+                    timings.sort()
+                    self.stdout.write(
+                        f"{label:<12}{statistics.fmean(timings):>10.2f}"
+                        f"{timings[len(timings) // 2]:>10.2f}{timings[int(len(timings) * 0.99)]:>10.2f}"
+                    )
+
+                drain_start = time.perf_counter()
+                stats = queued_handler.stats()
+                queued_handler.close()
+                self.stdout.write(
+                    f"queued handler: drained in {(time.perf_counter() - drain_start) * 1000:.1f} ms, "
+                    f"dropped={stats['dropped']} sampled_out={stats['sampled_out']}"
+                )
+            finally:
+                sync_handler.close()
+                queued_handler.close()
+                logger.handlers, level, logger.propagate = saved
+                logger.setLevel(level)
+
+
+class _Match:
+    def __init__(self, view_name):
+        self.view_name = view_name
@@ -0,0 +1,66 @@
+import os
+import re
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+ENCODINGS = [
+    ('identity', ''),
+    ('gzip', 'gzip'),
+    ('br', 'br, gzip'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load the admin login page and all of its static assets as a cold browser "
+        "would and report bytes transferred and worker time per Accept-Encoding. "
+        "Then count how many assets a warm revisit still has to revalidate. Run "
+        "`collectstatic` first, with DEBUG=False so hashed names are used."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page', default='/admin/login/')
+        parser.add_argument('--rounds', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if not os.path.isdir(settings.STATIC_ROOT):
+            raise CommandError(f"{settings.STATIC_ROOT} does not exist; run collectstatic first")
+        if settings.DEBUG:
+            self.stderr.write("DEBUG is on: assets are served unhashed and without immutable caching")
+
+        client = Client(SERVER_NAME='localhost')
+        page = client.get(options['page'])
+        if page.status_code != 200:
+            raise CommandError(f"{options['page']} returned {page.status_code}")
+        static_url = re.escape(settings.STATIC_URL)
+        assets = sorted(set(re.findall(rf'(?:href|src)="({static_url}[^"]+)"', page.content.decode())))
+        self.stdout.write(f"{options['page']}: {len(assets)} static assets")
+
+        self.stdout.write(f"{'encoding':<10}{'bytes':>12}{'worker ms':>12}")
+        for label, accept in ENCODINGS:
+            total_bytes = 0
+            elapsed = 0.0
+            for _ in range(options['rounds']):
+                total_bytes = 0
+                for url in assets:
+                    start = time.perf_counter()
+                    response = client.get(url, HTTP_ACCEPT_ENCODING=accept)
+                    body = b''.join(response.streaming_content) if response.streaming else response.content
+                    elapsed += time.perf_counter() - start
+                    total_bytes += len(body)
+            self.stdout.write(f"{label:<10}{total_bytes:>12,}{elapsed * 1000 / options['rounds']:>12.2f}")
+
+        revalidated = []
+        for url in assets:
+            response = client.get(url)
+            if 'immutable' not in response.get('Cache-Control', ''):
+                revalidated.append(url)
+        self.stdout.write(
+            f"warm revisit: {len(assets) - len(revalidated)} assets served from browser cache "
+            f"(immutable), {len(revalidated)} still revalidated"
+        )
+        for url in revalidated:
+            self.stdout.write(f"  {url}")
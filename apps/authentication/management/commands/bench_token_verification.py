@@ -0,0 +1,73 @@
+import json
+import time
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt import state
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.authentication.introspection import introspect_tokens
+from apps.authentication.signing import KeyRing, KeyRingTokenBackend, SigningKey
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare token verifications per second for a downstream service that "
+        "verifies locally against JWKS and one that calls batch introspection. "
+        "Introspection is timed in-process, so real numbers also pay the HTTP "
+        "round trip for every batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tokens', type=int, default=5000)
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--algorithm', choices=['RS256', 'EdDSA'], default='EdDSA')
+
+    def handle(self, *args, **options):
+        if options['algorithm'] == 'RS256':
+            private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        else:
+            private_key = ed25519.Ed25519PrivateKey.generate()
+        key_ring = KeyRing([SigningKey(private_key)])
+
+        saved_backend = state.token_backend
+        state.token_backend = KeyRingTokenBackend(key_ring)
+        try:
+            user_id = User.objects.values_list('pk', flat=True).first() or 0
+            tokens = []
+            for _ in range(options['tokens']):
+                token = AccessToken()
+                token['user_id'] = user_id
+                tokens.append(str(token))
+
+            self.stdout.write(
+                f"{len(tokens)} {options['algorithm']} access tokens, "
+                f"introspection batch size {options['batch_size']}"
+            )
+            self._report('local (JWKS)', len(tokens), self._verify_locally(key_ring, tokens))
+            self._report('introspect cold', len(tokens), self._introspect(tokens, options['batch_size']))
+            self._report('introspect warm', len(tokens), self._introspect(tokens, options['batch_size']))
+        finally:
+            state.token_backend = saved_backend
+
+    def _verify_locally(self, key_ring, tokens):
+        # What a consumer does: load the JWKS document once, then verify offline.
+        keys = {jwk['kid']: jwt.PyJWK(jwk) for jwk in json.loads(key_ring.jwks_body)['keys']}
+        start = time.perf_counter()
+        for token in tokens:
+            key = keys[jwt.get_unverified_header(token)['kid']]
+            jwt.decode(token, key.key, algorithms=[key.algorithm_name])
+        return time.perf_counter() - start
+
+    def _introspect(self, tokens, batch_size):
+        start = time.perf_counter()
+        for offset in range(0, len(tokens), batch_size):
+            introspect_tokens(tokens[offset:offset + batch_size])
+        return time.perf_counter() - start
+
+    def _report(self, label, count, elapsed):
+        self.stdout.write(f"{label:<18}{count / elapsed:>12,.0f} verifications/s")
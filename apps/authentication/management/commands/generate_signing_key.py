@@ -0,0 +1,43 @@
+import os
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.authentication.signing import SigningKey
+
+
+class Command(BaseCommand):
+    help = (
+        "Write a new PEM private key for JWT signing. To rotate, append it to "
+        "JWT_SIGNING_KEY_FILES so it is published in JWKS first, then move it to "
+        "the front once downstream caches have picked it up. Drop the old key "
+        "after REFRESH_TOKEN_LIFETIME has passed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--algorithm', choices=['RS256', 'EdDSA'], default='EdDSA')
+        parser.add_argument('--rsa-bits', type=int, default=2048)
+
+    def handle(self, *args, **options):
+        if options['algorithm'] == 'RS256':
+            private_key = rsa.generate_private_key(public_exponent=65537, key_size=options['rsa_bits'])
+        else:
+            private_key = ed25519.Ed25519PrivateKey.generate()
+
+        pem = private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption(),
+        )
+        # Private key: refuse to overwrite and keep it readable by the owner only.
+        try:
+            fd = os.open(options['path'], os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            raise CommandError(f"{options['path']} already exists")
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(pem)
+
+        key = SigningKey(private_key)
+        self.stdout.write(f"Wrote {key.algorithm} key {key.kid} to {options['path']}")
@@ -0,0 +1,51 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the SQLite primary onto the SQLite replica aliases in DATABASE_REPLICAS "
+        "so read/write routing can be exercised locally."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help="Keep syncing every N seconds (simulated replication lag)")
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES[DEFAULT_DB_ALIAS]
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError("The primary database is not SQLite")
+
+        replicas = [
+            (alias, settings.DATABASES[alias]['NAME'])
+            for alias in settings.DATABASE_REPLICAS
+            if settings.DATABASES[alias]['ENGINE'] == 'django.db.backends.sqlite3'
+        ]
+        if not replicas:
+            raise CommandError("No SQLite replicas configured; set DATABASE_REPLICA_URLS")
+
+        while True:
+            self._sync(primary['NAME'], replicas)
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def _sync(self, primary_path, replicas):
+        source = sqlite3.connect(primary_path)
+        try:
+            for alias, path in replicas:
+                # The backup API takes a consistent snapshot even while the
+                # primary is being written.
+                target = sqlite3.connect(path)
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(f"Synced {alias} ({path})")
+        finally:
+            source.close()
@@ -41,4 +41,20 @@ class UserProfile(models.Model):
         verbose_name_plural = 'User Profiles'
 
     def __str__(self):
-        return f"{self.user.username}'s profile"
\ No newline at end of file
+        return f"{self.user.username}'s profile"
+
+class TokenRevocation(models.Model):
+    """
+    Time of the user's last global logout. Access tokens issued before it are
+    reported revoked by batch introspection.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='token_revocation')
+    revoked_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'token_revocation'
+        verbose_name = 'Token Revocation'
+        verbose_name_plural = 'Token Revocations'
+
+    def __str__(self):
+        return f"{self.user.username} logged out at {self.revoked_at}"
@@ -0,0 +1,20 @@
+from django.conf import settings
+from rest_framework import permissions
+
+
+class IsIntrospectionClient(permissions.BasePermission):
+    """
+    Allow staff users and service accounts in the JWT_INTROSPECTION_GROUP
+    group. Batch introspection reveals other users' token status, so ordinary
+    logged-in users must not reach it.
+    """
+    message = "introspection_not_allowed"
+
+    def has_permission(self, request, view):
+        user = request.user
+        if not user or not user.is_authenticated:
+            return False
+        if user.is_staff:
+            return True
+        group = getattr(settings, 'JWT_INTROSPECTION_GROUP', 'token-introspection')
+        return user.groups.filter(name=group).exists()
@@ -0,0 +1,183 @@
+"""
+Asymmetric JWT signing with a rotating key ring.
+
+Tokens are signed with the first key in ``settings.JWT_SIGNING_KEY_FILES`` and
+carry its ``kid`` in the header. The remaining keys are kept to verify tokens
+issued before a rotation and are published, together with the active key, in
+the JWKS document so other services can verify tokens locally.
+
+RSA keys sign with RS256 and Ed25519 keys with EdDSA. A ring may mix both, so
+moving from one algorithm to the other is just another rotation.
+"""
+import base64
+import hashlib
+import json
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.exceptions import TokenBackendError, TokenBackendExpiredToken
+from rest_framework_simplejwt.settings import api_settings
+
+# JWK members that make up the RFC 7638 thumbprint, per key type.
+_THUMBPRINT_MEMBERS = {
+    'RSA': ('e', 'kty', 'n'),
+    'OKP': ('crv', 'kty', 'x'),
+}
+
+
+class SigningKey:
+    """A private key together with its derived public JWK and ``kid``."""
+
+    def __init__(self, private_key):
+        if isinstance(private_key, rsa.RSAPrivateKey):
+            self.algorithm = 'RS256'
+            jwk = RSAAlgorithm.to_jwk(private_key.public_key(), as_dict=True)
+        elif isinstance(private_key, ed25519.Ed25519PrivateKey):
+            self.algorithm = 'EdDSA'
+            jwk = OKPAlgorithm.to_jwk(private_key.public_key(), as_dict=True)
+        else:
+            raise ValueError(f"Unsupported signing key type: {type(private_key).__name__}")
+
+        self.private_key = private_key
+        self.public_key = private_key.public_key()
+        self.kid = _thumbprint(jwk)
+        self.jwk = dict(jwk, kid=self.kid, alg=self.algorithm, use='sig')
+
+    @classmethod
+    def from_pem(cls, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        return cls(serialization.load_pem_private_key(data, password=None))
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'rb') as fh:
+            return cls.from_pem(fh.read())
+
+
+class KeyRing:
+    """Ordered set of signing keys; ``active`` signs, all of them verify."""
+
+    def __init__(self, keys):
+        self.keys = list(keys)
+        if not self.keys:
+            raise ValueError("A key ring needs at least one key")
+        self.active = self.keys[0]
+        self._by_kid = {key.kid: key for key in self.keys}
+
+        # The JWKS document only changes on deploy, so render it and its ETag once.
+        self.jwks_body = json.dumps({'keys': [key.jwk for key in self.keys]}, separators=(',', ':')).encode('utf-8')
+        self.jwks_etag = hashlib.sha256(self.jwks_body).hexdigest()[:32]
+
+    @classmethod
+    def from_files(cls, paths):
+        return cls(SigningKey.from_file(path) for path in paths)
+
+    def get(self, kid):
+        return self._by_kid.get(kid)
+
+
+class KeyRingTokenBackend(TokenBackend):
+    """simplejwt ``TokenBackend`` that signs with the ring's active key and
+    picks the verifying key from the token's ``kid``."""
+
+    def __init__(self, key_ring, audience=None, issuer=None, leeway=None, json_encoder=None):
+        super().__init__(
+            key_ring.active.algorithm,
+            audience=audience,
+            issuer=issuer,
+            leeway=leeway,
+            json_encoder=json_encoder,
+        )
+        self.key_ring = key_ring
+
+    def encode(self, payload):
+        jwt_payload = payload.copy()
+        if self.audience is not None:
+            jwt_payload['aud'] = self.audience
+        if self.issuer is not None:
+            jwt_payload['iss'] = self.issuer
+
+        active = self.key_ring.active
+        token = jwt.encode(
+            jwt_payload,
+            active.private_key,
+            algorithm=active.algorithm,
+            headers={'kid': active.kid},
+            json_encoder=self.json_encoder,
+        )
+        if isinstance(token, bytes):
+            return token.decode('utf-8')
+        return token
+
+    def decode(self, token, verify=True):
+        try:
+            if not verify:
+                return jwt.decode(token, options={'verify_signature': False, 'verify_aud': False})
+
+            kid = jwt.get_unverified_header(token).get('kid')
+            key = self.key_ring.get(kid)
+            if key is None:
+                raise TokenBackendError(_("Token signed with an unknown key"))
+
+            return jwt.decode(
+                token,
+                key.public_key,
+                algorithms=[key.algorithm],
+                audience=self.audience,
+                issuer=self.issuer,
+                leeway=self.get_leeway(),
+                options={'verify_aud': self.audience is not None},
+            )
+        except jwt.ExpiredSignatureError as ex:
+            raise TokenBackendExpiredToken(_("Token is expired")) from ex
+        except jwt.InvalidAlgorithmError as ex:
+            raise TokenBackendError(_("Invalid algorithm specified")) from ex
+        except jwt.InvalidTokenError as ex:
+            raise TokenBackendError(_("Token is invalid")) from ex
+
+
+_key_ring = None
+
+
+def get_key_ring():
+    """Key ring built from ``settings.JWT_SIGNING_KEY_FILES``, or ``None`` when
+    the service still signs with the shared HS256 ``SECRET_KEY``."""
+    global _key_ring
+    paths = getattr(settings, 'JWT_SIGNING_KEY_FILES', None)
+    if not paths:
+        return None
+    if _key_ring is None:
+        _key_ring = KeyRing.from_files(paths)
+    return _key_ring
+
+
+def install_token_backend():
+    """Point simplejwt at the key ring. Called from ``AppConfig.ready``."""
+    key_ring = get_key_ring()
+    if key_ring is None:
+        return
+
+    # Every simplejwt token resolves its backend lazily from this module
+    # attribute, so swapping it here covers login, refresh, auth and logout.
+    from rest_framework_simplejwt import state
+
+    state.token_backend = KeyRingTokenBackend(
+        key_ring,
+        audience=api_settings.AUDIENCE,
+        issuer=api_settings.ISSUER,
+        leeway=api_settings.LEEWAY,
+        json_encoder=api_settings.JSON_ENCODER,
+    )
+
+
+def _thumbprint(jwk):
+    members = _THUMBPRINT_MEMBERS[jwk['kty']]
+    canonical = json.dumps({m: jwk[m] for m in members}, separators=(',', ':'), sort_keys=True)
+    digest = hashlib.sha256(canonical.encode('utf-8')).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
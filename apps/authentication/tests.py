@@ -1,3 +1,386 @@
-from django.test import TestCase
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from unittest import mock
 
-# Create your tests here.
+import jwt
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import resolve
+from rest_framework_simplejwt.exceptions import TokenBackendError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from app_marvel_backend.db_router import (
+    PrimaryReplicaRouter,
+    ReplicaHealth,
+    replica_health,
+    request_scope,
+    sqlite_copy_lag,
+    use_primary,
+)
+from app_marvel_backend.middleware import AccessLogMiddleware, PrimaryPinningMiddleware
+from utils.audit_log import ACCESS_LOGGER, AuditQueueHandler, JSONLinesFormatter
+from .introspection import introspect_tokens
+from .models import TokenRevocation
+from .signing import KeyRing, KeyRingTokenBackend, SigningKey
+
+User = get_user_model()
+
+
+def _record(event, **fields):
+    return logging.makeLogRecord(dict(fields, name='marvel.access', levelno=logging.INFO,
+                                      levelname='INFO', msg=event, event=event))
+
+
+class AuditLogTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'audit.jsonl')
+
+    def make_handler(self, **kwargs):
+        handler = AuditQueueHandler(filename=self.path, **kwargs)
+        self.addCleanup(handler.close)
+        return handler
+
+    def read_lines(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, encoding='utf-8') as fh:
+            return [json.loads(line) for line in fh if line.strip()]
+
+    def wait_for_lines(self, count, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            lines = self.read_lines()
+            if len(lines) >= count:
+                return lines
+            time.sleep(0.01)
+        return self.read_lines()
+
+    def test_formatter_emits_extra_fields_as_top_level_keys(self):
+        line = json.loads(JSONLinesFormatter().format(_record('login', user_id=5, outcome='success')))
+
+        self.assertEqual(line['event'], 'login')
+        self.assertEqual(line['user_id'], 5)
+        self.assertEqual(line['outcome'], 'success')
+        self.assertEqual(line['logger'], 'marvel.access')
+        self.assertNotIn('message', line)
+
+    def test_sampled_event_is_dropped_or_tagged_with_rate(self):
+        handler = self.make_handler(sample_rates={'token_refresh': 0.5}, flush_interval=0.05)
+
+        with mock.patch('utils.audit_log.random.random', return_value=0.9):
+            handler.handle(_record('token_refresh'))
+        with mock.patch('utils.audit_log.random.random', return_value=0.1):
+            handler.handle(_record('token_refresh'))
+        handler.handle(_record('login'))
+        handler.close()
+
+        lines = self.read_lines()
+        self.assertEqual(handler.sampled_out, 1)
+        self.assertEqual([line['event'] for line in lines], ['token_refresh', 'login'])
+        self.assertEqual(lines[0]['sample_rate'], 0.5)
+        self.assertNotIn('sample_rate', lines[1])
+
+    def test_full_queue_counts_drops_and_reports_them(self):
+        handler = self.make_handler(max_queue=1)
+
+        # Keep the writer from draining the queue until both records are in.
+        with mock.patch.object(handler, '_ensure_writer'):
+            handler.handle(_record('login'))
+            handler.handle(_record('logout'))
+        self.assertEqual(handler.dropped, 1)
+
+        handler._ensure_writer()
+        handler.close()
+
+        lines = self.read_lines()
+        self.assertEqual(lines[0]['event'], 'login')
+        self.assertEqual(lines[-1]['event'], 'log_dropped')
+        self.assertEqual(lines[-1]['dropped'], 1)
+
+    def test_flushes_when_batch_is_full(self):
+        handler = self.make_handler(batch_size=3, flush_interval=60)
+
+        handler.handle(_record('login'))
+        handler.handle(_record('login'))
+        time.sleep(0.1)
+        self.assertEqual(self.read_lines(), [])
+
+        handler.handle(_record('login'))
+        self.assertEqual(len(self.wait_for_lines(3)), 3)
+
+    def test_flushes_partial_batch_after_interval(self):
+        handler = self.make_handler(batch_size=100, flush_interval=0.1)
+
+        handler.handle(_record('login'))
+
+        self.assertEqual([line['event'] for line in self.wait_for_lines(1)], ['login'])
+
+    def test_access_events_do_not_collide_with_audit_events(self):
+        middleware = AccessLogMiddleware(lambda request: HttpResponse())
+        events = []
+        for path in ('/admin/login/', '/api/auth/register/'):
+            request = RequestFactory().get(path)
+            request.resolver_match = resolve(path)
+            with self.assertLogs(ACCESS_LOGGER) as logs:
+                middleware(request)
+            events.append(logs.records[0].event)
+
+        self.assertEqual(events, ['http.admin:login', 'http.register'])
+
+class SigningTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.ed_key = SigningKey(ed25519.Ed25519PrivateKey.generate())
+        cls.rsa_key = SigningKey(rsa.generate_private_key(public_exponent=65537, key_size=2048))
+
+    def issue(self, key_ring):
+        with mock.patch('rest_framework_simplejwt.state.token_backend', KeyRingTokenBackend(key_ring)):
+            token = AccessToken()
+            token['user_id'] = 1
+            return str(token)
+
+    def test_token_carries_active_kid(self):
+        key_ring = KeyRing([self.ed_key, self.rsa_key])
+
+        header = jwt.get_unverified_header(self.issue(key_ring))
+
+        self.assertEqual(header['kid'], self.ed_key.kid)
+        self.assertEqual(header['alg'], 'EdDSA')
+
+    def test_token_from_rotated_out_key_still_verifies(self):
+        token = self.issue(KeyRing([self.rsa_key]))
+
+        payload = KeyRingTokenBackend(KeyRing([self.ed_key, self.rsa_key])).decode(token)
+
+        self.assertEqual(payload['user_id'], 1)
+
+    def test_unknown_kid_is_rejected(self):
+        token = self.issue(KeyRing([self.rsa_key]))
+
+        with self.assertRaises(TokenBackendError):
+            KeyRingTokenBackend(KeyRing([self.ed_key])).decode(token)
+
+    def test_jwks_returns_304_for_matching_etag(self):
+        key_ring = KeyRing([self.ed_key])
+        with mock.patch('apps.authentication.views.get_key_ring', return_value=key_ring):
+            response = self.client.get('/.well-known/jwks.json')
+            cached = self.client.get('/.well-known/jwks.json', HTTP_IF_NONE_MATCH=response['ETag'])
+            revalidated = self.client.head('/.well-known/jwks.json', HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['keys'][0]['kid'], self.ed_key.kid)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_generate_signing_key_refuses_to_overwrite(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'signing.pem')
+            open(path, 'w').close()
+
+            with self.assertRaisesMessage(CommandError, f'{path} already exists'):
+                call_command('generate_signing_key', path)
+            self.assertEqual(os.path.getsize(path), 0)
+
+class IntrospectionTests(TestCase):
+    def setUp(self):
+        caches['introspection'].clear()
+        self.user = User.objects.create_user('alice', password='Xk9#mq2Lz')
+
+    def test_reports_each_token(self):
+        other = User.objects.create_user('bob', password='Xk9#mq2Lz')
+        expired = AccessToken.for_user(self.user)
+        expired.set_exp(lifetime=timedelta(seconds=-60))
+        revoked_refresh = RefreshToken.for_user(self.user)
+        revoked_refresh.blacklist()
+        revoked_access = AccessToken.for_user(other)
+        TokenRevocation.objects.create(
+            user=other,
+            revoked_at=datetime.fromtimestamp(revoked_access['iat'] + 5, tz=timezone.utc),
+        )
+        active = AccessToken.for_user(self.user)
+
+        results = introspect_tokens(['garbage', str(expired), str(revoked_refresh), str(revoked_access), str(active)])
+
+        self.assertEqual([result['active'] for result in results], [False, False, False, False, True])
+        self.assertEqual(results[2]['reason'], 'revoked')
+        self.assertEqual(results[3]['reason'], 'revoked')
+        self.assertEqual(results[4]['jti'], active['jti'])
+        self.assertEqual(str(results[4]['user_id']), str(self.user.pk))
+
+    def test_token_issued_in_same_second_as_logout_is_revoked(self):
+        token = AccessToken.for_user(self.user)
+        revocation = TokenRevocation.objects.create(
+            user=self.user,
+            revoked_at=datetime.fromtimestamp(token['iat'] + 0.5, tz=timezone.utc),
+        )
+        same_second = introspect_tokens([str(token)])[0]
+
+        caches['introspection'].clear()
+        revocation.revoked_at = datetime.fromtimestamp(token['iat'] - 0.5, tz=timezone.utc)
+        revocation.save()
+        second_before = introspect_tokens([str(token)])[0]
+
+        self.assertEqual(same_second, {'active': False, 'reason': 'revoked'})
+        self.assertTrue(second_before['active'])
+
+    def test_batch_costs_three_queries(self):
+        other = User.objects.create_user('bob', password='Xk9#mq2Lz')
+        tokens = [str(AccessToken.for_user(user)) for user in (self.user, other) for _ in range(50)]
+        tokens.append(str(RefreshToken.for_user(self.user)))
+
+        with self.assertNumQueries(3):
+            results = introspect_tokens(tokens)
+
+        self.assertTrue(all(result['active'] for result in results))
+
+    def test_endpoint_requires_staff_or_service_group(self):
+        token = str(AccessToken.for_user(self.user))
+        url = '/api/auth/token/introspect/'
+        body = {'tokens': [token]}
+
+        denied = self.client.post(url, body, content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.user.groups.add(Group.objects.create(name='token-introspection'))
+        allowed = self.client.post(url, body, content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        self.assertEqual(denied.status_code, 403)
+        self.assertEqual(allowed.status_code, 200)
+        self.assertTrue(allowed.json()['data']['results'][0]['active'])
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'])
+class RouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        caches['db_pin'].clear()
+        patcher = mock.patch.object(replica_health, 'healthy', return_value=['replica_1'])
+        self.healthy = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_write_pins_later_reads_in_the_request(self):
+        with request_scope():
+            before = self.router.db_for_read(User)
+            self.router.db_for_write(User)
+            after = self.router.db_for_read(User)
+
+        self.assertEqual(before, 'replica_1')
+        self.assertEqual(after, 'default')
+
+    def test_write_pins_the_user_for_the_next_request(self):
+        reads = []
+
+        def write(request):
+            self.router.db_for_write(User)
+            request.user = mock.Mock(pk=7, is_authenticated=True)
+            return HttpResponse()
+
+        def read(request):
+            reads.append(self.router.db_for_read(User))
+            return HttpResponse()
+
+        token = AccessToken()
+        token['user_id'] = 7
+        response = PrimaryPinningMiddleware(write)(RequestFactory().post('/'))
+        PrimaryPinningMiddleware(read)(RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}'))
+        PrimaryPinningMiddleware(read)(RequestFactory().get('/'))
+
+        self.assertEqual(reads, ['default', 'replica_1'])
+        self.assertEqual(response.cookies['db_pin']['samesite'], 'None')
+        self.assertFalse(response.cookies['db_pin']['secure'])
+
+        with self.settings(DATABASE_PRIMARY_PIN_COOKIE_SECURE=True):
+            response = PrimaryPinningMiddleware(write)(RequestFactory().post('/'))
+        self.assertTrue(response.cookies['db_pin']['secure'])
+
+    def test_write_outside_a_request_does_not_pin(self):
+        self.router.db_for_write(User)
+
+        self.assertEqual(self.router.db_for_read(User), 'replica_1')
+
+    def test_pin_cache_outage_reads_from_primary_and_keeps_writes(self):
+        reads = []
+
+        def write(request):
+            self.router.db_for_write(User)
+            request.user = mock.Mock(pk=7, is_authenticated=True)
+            return HttpResponse()
+
+        def read(request):
+            reads.append(self.router.db_for_read(User))
+            return HttpResponse()
+
+        token = AccessToken()
+        token['user_id'] = 7
+        cache = caches['db_pin']
+        with mock.patch.object(cache, 'get', side_effect=ConnectionError('cache down')), \
+                mock.patch.object(cache, 'set_many', side_effect=ConnectionError('cache down')), \
+                self.assertLogs('app_marvel_backend.db_router', logging.WARNING) as logs:
+            response = PrimaryPinningMiddleware(write)(RequestFactory().post('/'))
+            PrimaryPinningMiddleware(read)(RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(reads, ['default'])
+        self.assertEqual(len(logs.records), 2)
+
+    def test_use_primary_and_primary_only_models_read_from_primary(self):
+        with request_scope():
+            with use_primary():
+                pinned = self.router.db_for_read(User)
+            blacklist = self.router.db_for_read(BlacklistedToken)
+            revocation = self.router.db_for_read(TokenRevocation)
+
+        self.assertEqual([pinned, blacklist, revocation], ['default'] * 3)
+
+    def test_no_healthy_replica_falls_back_to_primary(self):
+        self.healthy.return_value = []
+
+        with request_scope():
+            self.assertEqual(self.router.db_for_read(User), 'default')
+
+    def test_health_check_rejects_lagging_or_unreachable_replicas(self):
+        health = ReplicaHealth()
+
+        with mock.patch('app_marvel_backend.db_router.replica_lag', return_value=60.0):
+            lagging = health.check('replica_1')
+        with mock.patch('app_marvel_backend.db_router.replica_lag', return_value=0.0):
+            current = health.check('replica_1')
+        with tempfile.TemporaryDirectory() as tmp:
+            missing = mock.Mock(vendor='sqlite', settings_dict={'NAME': os.path.join(tmp, 'replica.sqlite3')})
+            with mock.patch('app_marvel_backend.db_router.connections') as connections:
+                connections.__getitem__.return_value = missing
+                with self.assertLogs('app_marvel_backend.db_router', logging.WARNING):
+                    unreachable = health.check('replica_1')
+            self.assertFalse(os.path.exists(missing.settings_dict['NAME']))
+
+        self.assertFalse(lagging)
+        self.assertTrue(current)
+        self.assertFalse(unreachable)
+
+    def test_sqlite_copy_lag(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            primary = os.path.join(tmp, 'primary.sqlite3')
+            replica = os.path.join(tmp, 'replica.sqlite3')
+            for path in (primary, replica):
+                open(path, 'w').close()
+            now = time.time()
+
+            os.utime(primary, (now - 30, now - 30))
+            os.utime(replica, (now - 20, now - 20))
+            fresh = sqlite_copy_lag(primary, replica)
+            os.utime(primary, (now - 10, now - 10))
+            stale = sqlite_copy_lag(primary, replica)
+
+        self.assertEqual(fresh, 0.0)
+        self.assertAlmostEqual(stale, 20, delta=2)
@@ -6,6 +6,8 @@ urlpatterns = [
     # Authentication endpoints
     path('login/', views.CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/introspect/', views.introspect_tokens_view, name='token_introspect'),
+    path('jwks/', views.jwks, name='jwks'),
     path('register/', views.register_user, name='register'),
     path('logout/', views.logout_user, name='logout'),
     
@@ -1,3 +1,6 @@
+import logging
+from contextlib import nullcontext
+
 from rest_framework import status, generics, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
@@ -7,14 +10,25 @@ from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
 from rest_framework_simplejwt.token_blacklist.models import OutstandingToken, BlacklistedToken
 from django.contrib.auth import get_user_model, authenticate
 from django.contrib.auth.hashers import check_password
+from django.conf import settings
 from django.db.utils import OperationalError
+from django.http import HttpResponse
+from django.utils import timezone
+from django.views.decorators.http import condition, require_safe
+from app_marvel_backend.db_router import identity_pinned, pin_identity, use_primary
+from utils.audit_log import audit
 from utils.responses import success_response, error_response
+from .introspection import introspect_tokens
+from .models import TokenRevocation
+from .permissions import IsIntrospectionClient
 from .serializers import (
     UserRegistrationSerializer, 
     CustomTokenObtainPairSerializer,
     UserSerializer,
-    PasswordChangeSerializer
+    PasswordChangeSerializer,
+    TokenIntrospectionSerializer
 )
+from .signing import get_key_ring
 
 User = get_user_model()
 
@@ -28,14 +42,21 @@ class CustomTokenObtainPairView(TokenObtainPairView):
             # Be careful: accessing `serializer.errors` before `is_valid()` runs
             # raises an AssertionError in DRF. Call `is_valid()` and handle
             # validation or OperationalError from token creation separately.
+            # A user who registered moments ago may not be on the replicas yet.
+            username = request.data.get('username') if hasattr(request.data, 'get') else None
             try:
-                serializer.is_valid(raise_exception=True)
+                with use_primary() if identity_pinned('username', username) else nullcontext():
+                    serializer.is_valid(raise_exception=True)
+                pin_identity('user', getattr(serializer.user, 'id', None))
+                audit('login', request, outcome='success', user_id=getattr(serializer.user, 'id', None))
                 return success_response(
                     data=serializer.validated_data
                 )
             except OperationalError as oe:
                 # Token creation may attempt to write OutstandingToken (blacklist)
                 # which requires migrations. Surface a clear admin-guidance message.
+                audit('login', request, level=logging.ERROR, exc_info=True, outcome='error',
+                      reason='tokens_unavailable')
                 return error_response(
                     message=(
                         "tokens_unavailable: token storage not ready; ensure "
@@ -51,6 +72,8 @@ class CustomTokenObtainPairView(TokenObtainPairView):
                 # if present, otherwise return a generic invalid_credentials
                 # message so the client receives JSON (not an HTML 500 page).
                 errors = getattr(serializer, '_errors', None)
+                audit('login', request, level=logging.WARNING, outcome='failure',
+                      username=request.data.get('username') if hasattr(request.data, 'get') else None)
                 return error_response(
                     message="invalid_credentials",
                     errors=errors,
@@ -59,6 +82,7 @@ class CustomTokenObtainPairView(TokenObtainPairView):
         except Exception as e:
             # Catch any unexpected errors (e.g. serializer creation or other runtime
             # issues) and return a JSON error response instead of an HTML 500 page.
+            audit('login', request, level=logging.ERROR, exc_info=True, outcome='error')
             return error_response(
                 message="login_failed",
                 errors=str(e),
@@ -72,8 +96,12 @@ def register_user(request):
     Register a new user
     """
     serializer = UserRegistrationSerializer(data=request.data)
-    
-    if serializer.is_valid():
+
+    # Check username uniqueness against the primary, not a lagging replica.
+    with use_primary():
+        is_valid = serializer.is_valid()
+
+    if is_valid:
         user = serializer.save()
         # Try to generate tokens for the new user. If token_blacklist tables
         # haven't been migrated (OperationalError), return success without
@@ -89,6 +117,9 @@ def register_user(request):
                 "is migrated"
             )
 
+        pin_identity('user', user.id)
+        pin_identity('username', user.username)
+        audit('register', request, outcome='success', user_id=user.id)
         response_data = {'user': UserSerializer(user).data}
         response_data.update(token_data)
 
@@ -98,6 +129,7 @@ def register_user(request):
             message=extra_msg if extra_msg else None
         )
     
+    audit('register', request, level=logging.WARNING, outcome='failure')
     return error_response(
         message="registration_failed",
         errors=serializer.errors,
@@ -142,14 +174,18 @@ def change_password(request):
         user = request.user
 
         if not check_password(serializer.validated_data['old_password'], user.password):
+            audit('password_change', request, level=logging.WARNING, outcome='failure',
+                  user_id=user.id, reason='old_password_incorrect')
             return error_response(
                 message="Old password is incorrect",
                 status_code=status.HTTP_400_BAD_REQUEST
             )
 
         user.set_password(serializer.validated_data['new_password'])
-        user.save()
+        # request.user may come from a replica; only write the field we changed.
+        user.save(update_fields=['password'])
 
+        audit('password_change', request, outcome='success', user_id=user.id)
         return success_response()
 
     return error_response(
@@ -181,6 +217,7 @@ def logout_user(request):
             # Validate the token (will raise if invalid/expired)
             untoken = UntypedToken(access_token)
         except (TokenError, InvalidToken) as exc:
+            audit('logout', request, level=logging.WARNING, outcome='failure', reason='invalid_token')
             return error_response(
                 message="Invalid or expired token",
                 status_code=status.HTTP_401_UNAUTHORIZED
@@ -214,19 +251,69 @@ def logout_user(request):
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
 
-            for outstanding in OutstandingToken.objects.filter(user=user):
-                BlacklistedToken.objects.get_or_create(token=outstanding)
+            # Enumerate from the primary so a token issued moments ago on
+            # another worker isn't missed by a lagging replica.
+            with use_primary():
+                for outstanding in OutstandingToken.objects.filter(user=user):
+                    BlacklistedToken.objects.get_or_create(token=outstanding)
+            # Access tokens can't be blacklisted; record the logout so
+            # introspection reports the ones issued before it as revoked.
+            TokenRevocation.objects.update_or_create(user=user, defaults={'revoked_at': timezone.now()})
         except Exception as e:
             # More specific feedback if blacklisting/storage fails
+            audit('logout', request, level=logging.ERROR, exc_info=True, outcome='error',
+                  user_id=user.id, reason='blacklist_failed')
             return error_response(
                 message=f"Failed to blacklist tokens: {str(e)}",
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+        audit('logout', request, outcome='success', user_id=user.id)
         return success_response()
     except Exception as e:
         # Return exception text to help debugging client-side issues
+        audit('logout', request, level=logging.ERROR, exc_info=True, outcome='error')
         return error_response(
             message=f"Logout failed: {str(e)}",
             status_code=status.HTTP_400_BAD_REQUEST
-        )
\ No newline at end of file
+        )
+
+def _jwks_etag(request):
+    key_ring = get_key_ring()
+    return key_ring.jwks_etag if key_ring else None
+
+
+@require_safe
+@condition(etag_func=_jwks_etag)
+def jwks(request):
+    """
+    Public signing keys as a standard JWKS document so other services can
+    verify tokens locally. Returned bare (no success wrapper) because JWKS
+    clients expect the RFC 7517 shape; an empty key set means tokens are
+    still HS256-signed.
+    """
+    key_ring = get_key_ring()
+    body = key_ring.jwks_body if key_ring else b'{"keys":[]}'
+    response = HttpResponse(body, content_type='application/json')
+    max_age = getattr(settings, 'JWKS_CACHE_MAX_AGE', 300)
+    response['Cache-Control'] = f'public, max-age={max_age}, stale-while-revalidate={max_age}'
+    return response
+
+@api_view(['POST'])
+@permission_classes([IsIntrospectionClient])
+def introspect_tokens_view(request):
+    """
+    Batch introspection: validate up to JWT_INTROSPECTION_MAX_TOKENS tokens
+    and report per-token validity and revocation status. Restricted to staff
+    and service accounts (see IsIntrospectionClient).
+    """
+    serializer = TokenIntrospectionSerializer(data=request.data)
+    if not serializer.is_valid():
+        return error_response(
+            message="introspection_failed",
+            errors=serializer.errors,
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
+
+    results = introspect_tokens(serializer.validated_data['tokens'])
+    return success_response(data={'results': results})
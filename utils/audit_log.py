@@ -0,0 +1,241 @@
+"""
+Structured, non-blocking access and audit logging.
+
+Request workers never write to disk or stdout themselves: ``AuditQueueHandler``
+drops each record into a bounded in-memory queue and a single background thread
+formats the records as JSON lines and writes them out in batches. When the queue
+is full the record is dropped and counted instead of blocking the worker, and
+high-volume events (e.g. token refresh) can be sampled per event type.
+"""
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+ACCESS_LOGGER = 'marvel.access'
+AUDIT_LOGGER = 'marvel.audit'
+
+# Attributes every LogRecord carries; anything else was passed via `extra`.
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+_STOP = object()
+
+audit_logger = logging.getLogger(AUDIT_LOGGER)
+
+
+class JSONLinesFormatter(logging.Formatter):
+    """Render a record as one compact JSON object per line.
+
+    Fields passed through ``extra`` are emitted as top-level keys next to the
+    timestamp, level, logger name and event.
+    """
+
+    def format(self, record):
+        message = record.getMessage()
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': getattr(record, 'event', None) or message,
+        }
+        if message != payload['event']:
+            payload['message'] = message
+
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and key not in payload:
+                payload[key] = value
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exc'] = record.exc_text
+
+        return json.dumps(payload, default=str, separators=(',', ':'))
+
+
+class AuditQueueHandler(logging.Handler):
+    """Logging handler that hands records to a background JSON-lines writer.
+
+    ``emit`` only does a non-blocking ``put_nowait`` on a bounded queue, so a
+    slow disk or a burst of traffic can never stall a request. Records that do
+    not fit are counted in ``dropped`` and reported by the writer as a
+    ``log_dropped`` line on its next flush.
+
+    The writer flushes whenever ``batch_size`` lines are buffered or
+    ``flush_interval`` seconds have passed, whichever comes first.
+
+    ``sample_rates`` maps an event name to the fraction of its records to keep
+    (``{'token_refresh': 0.1}`` keeps roughly one refresh in ten). Kept records
+    carry a ``sample_rate`` field so counts can be re-weighted downstream.
+    """
+
+    def __init__(self, filename=None, max_queue=10000, batch_size=200, flush_interval=1.0,
+                 sample_rates=None, level=logging.NOTSET):
+        super().__init__(level)
+        self.filename = filename
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = float(flush_interval)
+        self.sample_rates = {event: float(rate) for event, rate in (sample_rates or {}).items()}
+        self.queue = queue.Queue(maxsize=int(max_queue))
+        self.dropped = 0
+        self.sampled_out = 0
+        self.formatter = JSONLinesFormatter()
+
+        self._reported_dropped = 0
+        self._stream = None
+        self._thread = None
+        self._pid = None
+
+    def emit(self, record):
+        # Handler.handle() holds self.lock around emit(), so the counters and
+        # the writer start-up below don't need their own locking.
+        event = getattr(record, 'event', None)
+        rate = self.sample_rates.get(event)
+        if rate is not None and rate < 1.0:
+            if random.random() >= rate:
+                self.sampled_out += 1
+                return
+            record.sample_rate = rate
+
+        self._ensure_writer()
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        """Freeze the record so the writer thread never sees mutable args or
+        holds on to a live traceback."""
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self.formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def stats(self):
+        return {
+            'queued': self.queue.qsize(),
+            'dropped': self.dropped,
+            'sampled_out': self.sampled_out,
+        }
+
+    def close(self):
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            try:
+                self.queue.put(_STOP, timeout=self.flush_interval)
+            except queue.Full:
+                pass
+            thread.join(timeout=max(self.flush_interval * 2, 1.0))
+        self._thread = None
+        super().close()
+
+    def _ensure_writer(self):
+        # Threads don't survive fork(), so a gunicorn worker that inherited a
+        # configured handler from its parent starts its own writer.
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        if self._pid is not None and self._pid != os.getpid():
+            self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            self._stream = None
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+        self._thread.start()
+
+    def _open_stream(self):
+        if not self.filename:
+            # Look stdout up on every flush; it may be swapped after start-up.
+            return sys.stdout
+        if self._stream is None:
+            self._stream = open(self.filename, 'a', encoding='utf-8')
+        return self._stream
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                record = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                record = None
+
+            if record is _STOP:
+                self._flush(batch)
+                if self._stream is not None:
+                    self._stream.close()
+                    self._stream = None
+                return
+
+            if record is not None:
+                try:
+                    batch.append(self.format(record))
+                except Exception:
+                    self.handleError(record)
+
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._flush(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def _flush(self, batch):
+        dropped = self.dropped
+        if dropped != self._reported_dropped:
+            batch.append(json.dumps({
+                'ts': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+                'level': 'WARNING',
+                'logger': __name__,
+                'event': 'log_dropped',
+                'dropped': dropped - self._reported_dropped,
+                'dropped_total': dropped,
+            }, separators=(',', ':')))
+            self._reported_dropped = dropped
+
+        if not batch:
+            return
+        try:
+            stream = self._open_stream()
+            stream.write('\n'.join(batch) + '\n')
+            stream.flush()
+        except Exception:
+            # Never let the writer thread die on an I/O error; report it the
+            # same way logging does for synchronous handlers.
+            self.handleError(logging.makeLogRecord({'msg': 'audit log write failed'}))
+
+
+def client_ip(request):
+    """Client address for log records.
+
+    The leftmost X-Forwarded-For entries are whatever the client sent, so only
+    the hop appended by the outermost of ``settings.TRUSTED_PROXY_COUNT``
+    proxies is trusted. With no trusted proxies this is ``REMOTE_ADDR``.
+    """
+    trusted = getattr(settings, 'TRUSTED_PROXY_COUNT', 0)
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if trusted and forwarded:
+        hops = [hop.strip() for hop in forwarded.split(',') if hop.strip()]
+        if len(hops) >= trusted:
+            return hops[-trusted]
+    return request.META.get('REMOTE_ADDR')
+
+
+def audit(event, request=None, level=logging.INFO, exc_info=None, **fields):
+    """Record an audit event such as ``login`` or ``password_change``.
+
+    Extra keyword arguments become top-level fields of the JSON line. When a
+    request is given, the client address and user agent are added.
+    """
+    if not audit_logger.isEnabledFor(level):
+        return
+    if request is not None:
+        fields.setdefault('ip', client_ip(request))
+        fields.setdefault('user_agent', request.META.get('HTTP_USER_AGENT'))
+    fields['event'] = event
+    audit_logger.log(level, event, exc_info=exc_info, extra=fields)